@@ -4,6 +4,7 @@
 
 import cv2
 import json
+import os
 import sys
 import time
 import base64
@@ -11,8 +12,35 @@ import torch
 import argparse
 from pathlib import Path
 from ultralytics import YOLO
+from ultralytics.utils import DEFAULT_CFG_DICT
 import threading
+import collections
+import queue
 import math
+import shutil
+import struct
+import tempfile
+import warnings
+import contextlib
+import numpy as np
+
+# orjson serializes several times faster than the stdlib encoder; json stays as a fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Model weights shipped next to this script; exported engines are cached beside them
+MODEL_STEM = "yolo11s"  # use nano for high FPS if you have it
+INFER_IMGSZ = 640
+MAX_BATCH = 4  # largest --batch; exported models are built with a dynamic batch up to this
+SEARCH_IMGSZ = 320  # idle "search" resolution while no dog is in view (dynamic models only)
+SEARCH_AFTER_FRAMES = 30  # drop to SEARCH_IMGSZ once no dog was detected for this many frames
+
+# Binary stdout records: NUL + tag + little-endian uint32 length + payload. Text lines never start
+# with NUL, so stray library logging on stdout stays distinguishable from framed records.
+FRAME_TAG = b"\x00F"  # raw JPEG bytes, belongs to the next META record
+META_TAG = b"\x00M"   # UTF-8 JSON object
 
 # ------------------------------
 # Threaded video capture class
@@ -20,7 +48,19 @@ import math
 class VideoStream:
     def __init__(self, src=0, width=640, height=480, fps=30):
         self.src = src
-        self.cap = cv2.VideoCapture(src)
+        if isinstance(src, int) and sys.platform.startswith('linux'):
+            # Open local webcams through V4L2 directly so the MJPG request below is honoured
+            self.cap = cv2.VideoCapture(src, cv2.CAP_V4L2)
+        else:
+            # Windows keeps the default MSMF backend; if a camera ignores MJPG there,
+            # cv2.CAP_DSHOW (DirectShow) is the backend that reliably negotiates it
+            self.cap = cv2.VideoCapture(src)
+
+        if isinstance(src, int):
+            # Ask UVC webcams for MJPG instead of raw YUYV: ~10x less USB bandwidth, so 640x480@30
+            # is reachable, and OpenCV decodes it with libjpeg-turbo. Must be set before the size.
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
         # RTSP-specific optimizations
         if isinstance(src, str) and (src.startswith('rtsp://') or src.startswith('http://')):
@@ -39,22 +79,57 @@ class VideoStream:
         if not self.cap.isOpened():
             raise RuntimeError(f"Failed to open camera source: {src}")
 
-        self.ret, self.frame = self.cap.read()
-        if not self.ret or self.frame is None:
+        ret, frame = self.cap.read()
+        if not ret or frame is None:
             raise RuntimeError(f"Failed to read initial frame from camera source: {src}")
 
+        # Single-slot SPSC hand-off: append/popleft on a deque are atomic under the GIL,
+        # so no lock is needed. cap.retrieve() allocates a fresh array per frame and nothing
+        # writes into it afterwards, so frames are handed over without copying.
+        self.frames = collections.deque(maxlen=1)
+        self.frames.append(frame)
+        self.new_frame = threading.Event()  # lets the consumer block instead of polling
+        self.new_frame.set()
+        self.wanted = threading.Event()  # consumer is waiting for the next frame
         self.stopped = False
-        threading.Thread(target=self.update, daemon=True).start()
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
 
     def update(self):
+        # All cv2.VideoCapture calls stay on this thread (it is not thread-safe)
         while not self.stopped:
-            self.ret, self.frame = self.cap.read()
-
-    def read(self):
-        return self.frame.copy() if self.ret else None
+            # grab() only pulls the next frame off the device/stream; the decode and colour
+            # conversion in retrieve() run only for frames the consumer actually asked for
+            if not self.cap.grab():
+                # camera temporarily unavailable: back off instead of spinning on grab()
+                time.sleep(0.1)
+                continue
+            if not self.wanted.is_set():
+                continue
+            ret, frame = self.cap.retrieve()
+            if ret and frame is not None:
+                self.wanted.clear()
+                self.frames.append(frame)
+                self.new_frame.set()
+
+    def read(self, timeout=1.0):
+        # Blocks until the next camera frame arrives (None on timeout); each frame is
+        # handed out at most once. Returned frames are not copied: callers must not draw
+        # on them in place.
+        self.wanted.set()
+        if not self.new_frame.wait(timeout):
+            return None
+        self.new_frame.clear()
+        try:
+            return self.frames.popleft()
+        except IndexError:
+            return None
 
     def stop(self):
         self.stopped = True
+        # Release only after the capture thread has left grab(): the capture is not thread-safe and
+        # tearing it down mid-grab aborts the process from inside the native backend
+        self.thread.join(timeout=2.0)
         try:
             self.cap.release()
         except:
@@ -62,26 +137,636 @@ class VideoStream:
 
 
 # ------------------------------
-# Utilities for simple tracker
+# Inference preprocessing
+# ------------------------------
+class FrameResizer:
+    """Downscales frames whose long side exceeds `size` into a preallocated buffer.
+
+    Ultralytics would otherwise allocate a fresh resized copy on every call. Frames that
+    already fit (the default 640x480 webcam) are returned untouched with scale 1.0.
+    """
+    def __init__(self, size=INFER_IMGSZ):
+        self.size = size
+        self.buffers = {}  # one buffer per batch slot
+
+    def __call__(self, frame, slot=0, size=None):
+        h, w = frame.shape[:2]
+        scale = (size or self.size) / max(h, w)
+        if scale >= 1.0:
+            return frame, 1.0
+        new_w, new_h = int(round(w * scale)), int(round(h * scale))
+        buffer = self.buffers.get(slot)
+        if buffer is None or buffer.shape[:2] != (new_h, new_w):
+            buffer = self.buffers[slot] = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        cv2.resize(frame, (new_w, new_h), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer, scale
+
+
+# ------------------------------
+# Threaded JPEG encode + JSON output
+# ------------------------------
+def to_json(obj):
+    # -> UTF-8 bytes, ready for sys.stdout.buffer without a str round trip
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+class OutputEmitter:
+    """Encodes frames and writes output records on a background thread.
+
+    JPEG encode + stdout writes overlap with the next frame's inference instead of
+    stalling the detection loop. Once started, all stdout output must go through
+    `submit` so records from the two threads never interleave.
+
+    By default the JPEG is sent as a raw FRAME_TAG record ahead of its META_TAG JSON record;
+    legacy=True keeps one JSON line per frame with the JPEG base64-encoded in `frame_data`.
+    If the consumer closes stdout the writer stops and `submit` raises BrokenPipeError.
+    """
+    def __init__(self, jpeg_quality=75, max_pending=2, legacy=False):
+        self.jpeg_quality = jpeg_quality
+        self.legacy = legacy
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.failed = threading.Event()  # set once stdout is gone
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, output, frame=None):
+        # Blocks when the writer is `max_pending` records behind, which back-pressures the loop,
+        # but never waits on a writer that has died
+        while True:
+            if self.failed.is_set() or not self.thread.is_alive():
+                raise BrokenPipeError("output consumer closed stdout")
+            try:
+                self.pending.put((output, frame), timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def write_record(self, tag, payload):
+        # Header and payload in one write so a log line from another thread cannot land in between
+        sys.stdout.buffer.write(b"".join((tag, struct.pack("<I", memoryview(payload).nbytes), payload)))
+
+    def run(self):
+        try:
+            self.write_loop()
+        except OSError:
+            # BrokenPipeError/EINVAL: the parent closed the pipe (e.g. Electron quit without killing us)
+            self.failed.set()
+
+    def write_loop(self):
+        out = sys.stdout.buffer
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            output, frame = item
+            buffer = None
+            if frame is not None:
+                try:
+                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                except Exception:
+                    pass
+            if buffer is not None:
+                if self.legacy:
+                    output["frame_data"] = base64.b64encode(buffer).decode('ascii')
+                else:
+                    self.write_record(FRAME_TAG, buffer)
+            if self.legacy:
+                # One write per record: no text-layer encode and no separate newline write
+                out.write(to_json(output) + b"\n")
+            else:
+                self.write_record(META_TAG, to_json(output))
+            out.flush()
+
+    def close(self, timeout=2.0):
+        try:
+            self.pending.put(None, timeout=timeout)
+        except queue.Full:
+            pass  # writer is stuck or dead; the join below still gives up after `timeout`
+        self.thread.join(timeout=timeout)
+
+
+# ------------------------------
+# Model loading
+# ------------------------------
+def export_model(model_dir, device):
+    """Export the .pt weights to the accelerated format for `device`; returns the exported file.
+
+    CUDA builds a TensorRT FP16 engine (fused conv+bn+act, Tensor Core kernels), CPU an ONNX graph.
+    A TorchScript fallback left by an earlier failed export is removed once this succeeds.
+    """
+    pt_path = model_dir / f"{MODEL_STEM}.pt"
+    if device.startswith("cuda"):
+        export_kwargs = {"format": "engine", "half": True, "dynamic": True, "batch": MAX_BATCH, "workspace": 4}
+    else:
+        export_kwargs = {"format": "onnx", "opset": 17, "dynamic": True}
+    exported = Path(YOLO(str(pt_path)).export(imgsz=INFER_IMGSZ, device=device, **export_kwargs))
+    (model_dir / f"{MODEL_STEM}.torchscript").unlink(missing_ok=True)
+    return exported
+
+
+@contextlib.contextmanager
+def quiet_jit_load():
+    # torch.jit.load (TorchScript fallback) warns about its own deprecation on stderr, which the app shows as an error
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=r"`torch\.jit\.load` is deprecated", category=FutureWarning)
+        yield
+
+
+def resolve_model_path(model_dir, device):
+    """Return the fastest model file available for `device`, exporting it once if missing.
+
+    CUDA prefers a TensorRT FP16 engine, CPU prefers ONNX (run through ONNX Runtime).
+    An INT8 model built with `--calibrate` takes precedence over both unless the
+    YOLO_PRECISION environment variable is set to "fp16".
+    When the export toolchain is not installed, falls back to a TorchScript export (which only
+    needs torch and loads without rebuilding the Python module graph), then to the PyTorch weights.
+    """
+    pt_path = model_dir / f"{MODEL_STEM}.pt"
+    suffix = ".engine" if device.startswith("cuda") else ".onnx"
+    exported_path = model_dir / f"{MODEL_STEM}{suffix}"
+    torchscript_path = model_dir / f"{MODEL_STEM}.torchscript"
+    int8_path = model_dir / f"{MODEL_STEM}_int8{suffix}"
+    precision = os.getenv("YOLO_PRECISION", "auto").lower()  # auto | int8 | fp16
+    if precision != "fp16" and int8_path.exists():
+        return int8_path
+    if precision == "int8":
+        print(json.dumps({"status": "precision_fallback",
+                          "message": f"{int8_path.name} not found (run with --calibrate); using FP16/FP32 model"}), flush=True)
+    if exported_path.exists():
+        return exported_path
+    # Left behind by an earlier failed export; `--export` retries the accelerated format
+    if torchscript_path.exists():
+        return torchscript_path
+
+    try:
+        print(json.dumps({"status": "exporting_model",
+                          "message": f"Exporting {pt_path.name} to {suffix[1:]} (first run only)..."}), flush=True)
+        return export_model(model_dir, device)
+    except Exception as e:
+        export_error = e
+
+    try:
+        # Dynamic so the traced Detect head still rebuilds its anchors for other input sizes
+        exported = YOLO(str(pt_path)).export(format="torchscript", dynamic=True, imgsz=INFER_IMGSZ, device=device)
+        print(json.dumps({"status": "export_skipped",
+                          "message": f"Using TorchScript model: {str(export_error)}"}), flush=True)
+        return Path(exported)
+    except Exception as e:
+        print(json.dumps({"status": "export_skipped",
+                          "message": f"Using PyTorch weights: {str(export_error)}; TorchScript: {str(e)}"}), flush=True)
+        return pt_path
+
+
+def letterbox_blob(image, size=INFER_IMGSZ):
+    # BGR uint8 HxWx3 -> RGB float32 1x3xSxS, padded the same way Ultralytics does (gray 114)
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return blob[None]
+
+
+def capture_calibration_frames(vs, out_dir, count, interval=0.5):
+    """Save `count` frames from the live camera, spaced out so lighting/poses vary."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    saved = 0
+    while saved < count:
+        frame = vs.read()
+        if frame is None:
+            continue
+        cv2.imwrite(str(out_dir / f"calib_{saved:04d}.jpg"), frame)
+        saved += 1
+        time.sleep(interval)
+    return saved
+
+
+def export_int8_model(model_dir, device, image_dir):
+    """Build `<stem>_int8.engine` (CUDA) or `<stem>_int8.onnx` (CPU) calibrated on `image_dir`."""
+    pt_path = model_dir / f"{MODEL_STEM}.pt"
+    with tempfile.TemporaryDirectory() as tmp:
+        # Export from a renamed copy so intermediate files never clobber the FP16/FP32 exports
+        tmp_pt = Path(tmp) / f"{MODEL_STEM}_int8.pt"
+        shutil.copy(pt_path, tmp_pt)
+        model = YOLO(str(tmp_pt))
+
+        if device.startswith("cuda"):
+            data_yaml = Path(tmp) / "calib.yaml"
+            # JSON is valid YAML; labels are not needed for activation-range calibration
+            data_yaml.write_text(json.dumps({"path": str(image_dir), "train": ".", "val": ".",
+                                             "names": dict(model.names)}))
+            exported = Path(model.export(format="engine", int8=True, data=str(data_yaml), dynamic=True,
+                                         batch=MAX_BATCH, imgsz=INFER_IMGSZ, device=device))
+            target = model_dir / exported.name
+            shutil.move(str(exported), target)
+            return target
+
+        import onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+        fp32_onnx = Path(model.export(format="onnx", opset=17, dynamic=True, imgsz=INFER_IMGSZ, device=device))
+        input_name = onnx.load(str(fp32_onnx), load_external_data=False).graph.input[0].name
+        images = sorted(image_dir.glob("*.jpg"))
+
+        class FrameReader(CalibrationDataReader):
+            def __init__(self):
+                self._it = iter(images)
+
+            def get_next(self):
+                path = next(self._it, None)
+                return None if path is None else {input_name: letterbox_blob(cv2.imread(str(path)))}
+
+        target = model_dir / fp32_onnx.name
+        quantize_static(str(fp32_onnx), str(target), FrameReader(), quant_format=QuantFormat.QDQ,
+                        per_channel=True, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+        # Ultralytics reads class names/stride from the ONNX metadata; carry it over
+        src_meta = onnx.load(str(fp32_onnx), load_external_data=False).metadata_props
+        quantized = onnx.load(str(target))
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(src_meta)
+        onnx.save(quantized, str(target))
+        return target
+
+
+# ------------------------------
+# Detection
+# ------------------------------
+def precision_kwargs(half):
+    """Predict kwargs that run PyTorch/TorchScript weights in FP16; empty when `half` is False.
+
+    Newer Ultralytics folds `half` into `quantize` and logs a deprecation warning to stdout on
+    every call that passes `half` at all, so it is only sent to versions that still expect it.
+    """
+    if not half:
+        return {}
+    return {"quantize": 16} if "quantize" in DEFAULT_CFG_DICT else {"half": True}
+
+
+def layout_kwargs(channels_last):
+    """Predict kwargs that run PyTorch weights in NHWC (channels_last); empty when not wanted.
+
+    The predictor deep-copies and fuses the model on setup and sets the copy's memory format
+    from this setting, so converting the caller's module has no effect. Older Ultralytics has
+    no such setting; InferenceWorker converts its predictor's model instead.
+    """
+    if not channels_last or "channels_last" not in DEFAULT_CFG_DICT:
+        return {}
+    return {"channels_last": True}
+
+
+def detect_dogs(model, frames, resizer, dog_class_id, device, predict_kwargs=None, imgsz=INFER_IMGSZ):
+    """Run YOLO once over a batch of BGR frames; returns a list of dog detections per frame.
+
+    Stacking frames into one call amortizes Ultralytics' per-call dispatch and kernel launch
+    overhead. `predict_kwargs` carries extra predict settings (see precision_kwargs); `imgsz` is
+    the network input size. Boxes are reported in each frame's own pixel coordinates.
+    A `dog_class_id` of None keeps every class (warm-up runs before the class map is known).
+    """
+    # Downscale oversized frames (e.g. 1080p RTSP) into reused buffers, one per batch slot
+    infer_frames, scales = [], []
+    for slot, frame in enumerate(frames):
+        infer_frame, scale = resizer(frame, slot, imgsz)
+        infer_frames.append(infer_frame)
+        scales.append(scale)
+
+    # Pass BGR frames straight through: Ultralytics treats numpy input as BGR
+    # (cv2 convention) and does its own channel swap during preprocessing.
+    # Increase conf or change iou for more stable detections.
+    # `classes` makes NMS drop every non-dog box on the device, before anything reaches Python,
+    # and `max_det` caps what survives it (Ultralytics' default of 300 is sized for crowded COCO scenes).
+    classes = None if dog_class_id is None else [dog_class_id]
+    results = model(infer_frames, device=device, imgsz=imgsz, conf=0.35, iou=0.45,
+                    classes=classes, max_det=20, verbose=False, **(predict_kwargs or {}))
+
+    # results holds one result object per input frame, in order
+    detections = []
+    for result, scale in zip(results, scales):
+        frame_detections = []
+        boxes = getattr(result, "boxes", None)
+        if boxes is not None:
+            # A single device->host copy of the whole [N,6] result (x1,y1,x2,y2,conf,cls)
+            # instead of one transfer per attribute or per-box scalar reads
+            data = boxes.data.cpu().numpy()
+            xyxy = data[:, :4]
+            confs = data[:, -2]
+            if scale != 1.0:
+                xyxy /= scale  # back to camera-frame pixels
+
+            for bbox, confidence in zip(xyxy.tolist(), confs.tolist()):
+                frame_detections.append({
+                    "class": "dog",
+                    "confidence": confidence,
+                    "bbox": bbox
+                })
+        detections.append(frame_detections)
+    return detections
+
+
+def warm_up(model, resizer, dog_class_id, device, predict_kwargs, batch_size, sizes, runs=2):
+    """Run blank batches at each input size before the first live frame.
+
+    The first calls build the predictor, load the backend, pick cuDNN/TensorRT kernels and
+    grow the CUDA allocator; doing that here keeps the spike off the first live frames.
+    """
+    dummy = np.zeros((480, 640, 3), dtype=np.uint8)
+    for imgsz in sizes:
+        for _ in range(runs):
+            detect_dogs(model, [dummy] * batch_size, resizer, dog_class_id, device, predict_kwargs, imgsz=imgsz)
+    if device.startswith("cuda"):
+        torch.cuda.synchronize(device)
+
+
+def accepts_any_imgsz(model):
+    """True if the loaded backend runs at input sizes other than the one it was exported at.
+
+    PyTorch weights always do; exports only when built with dynamic=True (ours are, but a
+    user-supplied or older file may not be). Needs the predictor, i.e. one call to `model` first.
+    """
+    backend = model.predictor.model
+    if getattr(backend, "format", None) == "pt" or getattr(backend, "pt", False):
+        return True
+    metadata = getattr(backend, "metadata", None) or {}
+    dynamic = metadata.get("dynamic", metadata.get("args", {}).get("dynamic"))
+    if dynamic is None:
+        dynamic = getattr(backend, "dynamic", False)
+    return bool(dynamic)
+
+
+class InferenceWorker:
+    """Runs detect_dogs() on its own thread so capture, encode and stdout overlap with inference.
+
+    Frames go in through a bounded queue that drops the oldest entry when full, so the worker
+    always infers on the freshest frames; it takes `batch_size` of them per YOLO call, at the
+    largest input size any of them asked for.
+    Each frame comes back with its detections, in order, through `poll()`.
+
+    The thread warms the model up at INFER_IMGSZ and `search_imgsz` before it takes frames, so
+    per-thread state (CUDA graphs, cuDNN handles) is built on the thread that runs inference;
+    `wait_ready()` blocks until that is done. A backend with a fixed input size resets
+    `search_imgsz` to INFER_IMGSZ instead of failing at the smaller size. With channels_last=True
+    on an Ultralytics without that predict setting, it converts the predictor's model to NHWC
+    itself. With compile=True the predictor's .pt model then runs under torch.compile
+    (reduce-overhead); if compiling fails the predictor is rebuilt eager and the error is kept
+    in `compile_error`. `dog_class_id` is read from the predictor's backend once it is loaded,
+    so exported models are only loaded once.
+    """
+    def __init__(self, model, resizer, device, predict_kwargs=None, batch_size=1,
+                 search_imgsz=INFER_IMGSZ, channels_last=False, compile=False):
+        self.model = model
+        self.resizer = resizer
+        self.dog_class_id = None
+        self.device = device
+        self.predict_kwargs = predict_kwargs
+        self.batch_size = batch_size
+        self.frames = queue.Queue(maxsize=batch_size)
+        self.results = queue.Queue(maxsize=4)
+        self.search_imgsz = search_imgsz
+        self.channels_last = channels_last
+        self.compile = compile
+        self.compile_error = None
+        self.error = None
+        self.ready = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame_number, frame, imgsz=INFER_IMGSZ):
+        """Queue a frame for detection; returns the (frame_number, frame) evicted for it, or None."""
+        # Never block the capture loop: evict the stalest queued frame instead
+        evicted = None
+        while True:
+            try:
+                self.frames.put_nowait((frame_number, frame, imgsz))
+                return evicted
+            except queue.Full:
+                try:
+                    evicted = self.frames.get_nowait()[:2]
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        try:
+            with quiet_jit_load():  # the first predict call loads the backend
+                self.setup_predictor()
+            if self.compile:
+                self.compile_model()
+            if self.search_imgsz != INFER_IMGSZ:
+                if accepts_any_imgsz(self.model):
+                    warm_up(self.model, self.resizer, self.dog_class_id, self.device, self.predict_kwargs,
+                            self.batch_size, [self.search_imgsz])
+                else:
+                    self.search_imgsz = INFER_IMGSZ
+        except Exception as e:
+            self.error = e  # re-raised on the main thread by wait_ready()
+            return
+        finally:
+            self.ready.set()
+        while not self.stopped:
+            batch = [self.frames.get()]
+            while len(batch) < self.batch_size:
+                batch.append(self.frames.get())
+            if self.stopped:
+                break
+            try:
+                detections = detect_dogs(self.model, [frame for _, frame, _ in batch],
+                                         self.resizer, self.dog_class_id, self.device, self.predict_kwargs,
+                                         imgsz=max(imgsz for _, _, imgsz in batch))
+            except Exception as e:
+                self.error = e  # re-raised on the main thread by poll()
+                return
+            for (frame_number, frame, _), frame_detections in zip(batch, detections):
+                self.results.put((frame_number, frame, frame_detections))
+
+    def setup_predictor(self):
+        # The first call builds the predictor, which runs its own deep copy of the model
+        warm_up(self.model, self.resizer, self.dog_class_id, self.device, self.predict_kwargs,
+                self.batch_size, [INFER_IMGSZ])
+        if self.dog_class_id is None:
+            # Resolve the dog class id once so per-frame filtering is an integer compare
+            names = self.model.predictor.model.names
+            self.dog_class_id = next((int(i) for i, name in names.items() if name == "dog"), None)
+            if self.dog_class_id is None:
+                raise RuntimeError("Model has no 'dog' class")
+        if self.channels_last and not layout_kwargs(True):
+            # Convert the predictor's fused copy, then pick the NHWC kernels before the first live frame
+            self.model.predictor.model.to(memory_format=torch.channels_last)
+            warm_up(self.model, self.resizer, self.dog_class_id, self.device, self.predict_kwargs,
+                    self.batch_size, [INFER_IMGSZ])
+
+    def compile_model(self):
+        # Compile the predictor's copy, not ours: that is the module that runs on the device in FP16.
+        # Compilation is lazy and CUDA graph trees are per-thread, so trigger both here on the inference thread
+        eager_kwargs = self.predict_kwargs
+        try:
+            if "compile" in DEFAULT_CFG_DICT:
+                # A new compile setting rebuilds the predictor, which compiles its model on setup
+                self.predict_kwargs = {**(eager_kwargs or {}), "compile": "reduce-overhead"}
+            else:
+                self.model.predictor.model = torch.compile(self.model.predictor.model, mode="reduce-overhead")
+            # .pt weights accept any input size, so both sizes can be compiled up front
+            warm_up(self.model, self.resizer, self.dog_class_id, self.device, self.predict_kwargs,
+                    self.batch_size, sorted({self.search_imgsz, INFER_IMGSZ}))
+            if not hasattr(self.model.predictor.model, "_orig_mod"):
+                # Ultralytics logs a failed compile and carries on eager
+                raise RuntimeError("Ultralytics left the model uncompiled")
+        except Exception as e:
+            self.compile_error = e
+            self.predict_kwargs = eager_kwargs
+            self.model.predictor = None  # rebuilt eager by the next call
+            self.setup_predictor()
+
+    def wait_ready(self):
+        """Block until the warm-up has finished; re-raises its error."""
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def poll(self):
+        """Return every (frame_number, frame, detections) finished since the last call."""
+        if self.error is not None:
+            raise self.error
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def stop(self, timeout=2.0):
+        self.stopped = True
+        # Wake run() if it is waiting for frames, then let an in-flight YOLO call finish: exiting
+        # while the backend is mid-inference aborts the interpreter from native code
+        for _ in range(self.batch_size):
+            self.submit(-1, None)
+        self.thread.join(timeout=timeout)
+
+
+# ------------------------------
+# Simple tracker
 # ------------------------------
-def iou(a, b):
-    # a and b are [x1,y1,x2,y2]
-    xa1, ya1, xa2, ya2 = a
-    xb1, yb1, xb2, yb2 = b
-    xi1, yi1 = max(xa1, xb1), max(ya1, yb1)
-    xi2, yi2 = min(xa2, xb2), min(ya2, yb2)
-    inter_w = max(0.0, xi2 - xi1)
-    inter_h = max(0.0, yi2 - yi1)
+def iou_matrix(a, b):
+    # a is [N,4], b is [M,4] arrays of [x1,y1,x2,y2]; returns [N,M] pairwise IoU
+    a = a[:, None, :]
+    b = b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0.0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0.0, None)
     inter = inter_w * inter_h
-    area_a = max(0.0, xa2 - xa1) * max(0.0, ya2 - ya1)
-    area_b = max(0.0, xb2 - xb1) * max(0.0, yb2 - yb1)
+    area_a = np.clip(a[..., 2] - a[..., 0], 0.0, None) * np.clip(a[..., 3] - a[..., 1], 0.0, None)
+    area_b = np.clip(b[..., 2] - b[..., 0], 0.0, None) * np.clip(b[..., 3] - b[..., 1], 0.0, None)
     union = area_a + area_b - inter
-    return inter / union if union > 0 else 0.0
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
 
 def ema_smooth(old_bbox, new_bbox, alpha):
     return [old_bbox[i] * (1 - alpha) + new_bbox[i] * alpha for i in range(4)]
 
 
+class DogTracker:
+    """Simple IoU-based tracker with EMA smoothing; assigns stable ids across frames."""
+    def __init__(self, alpha=0.6, iou_match_thresh=0.3, max_age=5, min_conf_keep=0.12,
+                 min_area_output=2000.0, min_hits_output=3):
+        self.tracked = []  # list of dicts: {"id": int, "bbox": [x1,y1,x2,y2], "class": ..., "confidence": ..., "age": 0, "hits": n}
+        self.next_track_id = 1  # unique ID counter for new tracks
+
+        # Tunable parameters (adjust to reduce stray/false alerts)
+        self.alpha = alpha  # EMA smoothing factor (0<alpha<=1). Higher => follow new detections faster.
+        self.iou_match_thresh = iou_match_thresh
+        self.max_age = max_age  # keep tracked object for up to N frames without matches (helps prevent flicker)
+        self.min_conf_keep = min_conf_keep  # if decayed confidence falls below this, drop track
+
+        # Output filtering options (frontend may also filter)
+        self.min_area_output = min_area_output  # if >0, will not include tiny detections in output (pixels^2)
+        self.min_hits_output = min_hits_output  # minimum number of hits before a track appears in output (set higher to reduce one-offs)
+
+    def update(self, raw_detections):
+        """Advance the tracker by one frame and return the detections to output."""
+        tracked = self.tracked
+        new_tracked = []
+        matched_old = set()
+
+        # All track/detection IoUs in one vectorized pass (only dog boxes reach the tracker,
+        # so no per-class masking is needed)
+        det_to_track = {}
+        if tracked and raw_detections:
+            track_xyxy = np.asarray([t["bbox"] for t in tracked], dtype=np.float32)
+            det_xyxy = np.asarray([d["bbox"] for d in raw_detections], dtype=np.float32)
+            iou_mat = iou_matrix(track_xyxy, det_xyxy)
+
+            # Greedy one-to-one assignment: take the highest remaining IoU pair until none
+            # clears the threshold, so two detections can never claim the same track id
+            for _ in range(min(iou_mat.shape)):
+                i, j = divmod(int(iou_mat.argmax()), iou_mat.shape[1])
+                if iou_mat[i, j] < self.iou_match_thresh:
+                    break
+                det_to_track[j] = i
+                iou_mat[i, :] = -1.0
+                iou_mat[:, j] = -1.0
+
+        # Match raw detections to tracked objects
+        for j, det in enumerate(raw_detections):
+            best_idx = det_to_track.get(j, -1)
+            if best_idx != -1:
+                old = tracked[best_idx]
+                smoothed_bbox = ema_smooth(old["bbox"], det["bbox"], self.alpha)
+                new_entry = {
+                    "id": old.get("id", None),
+                    "bbox": smoothed_bbox,
+                    "class": det["class"],
+                    "confidence": max(det["confidence"], old.get("confidence", 0.0)),
+                    "hits": int(old.get("hits", 0) + 1),
+                    "age": 0
+                }
+                new_tracked.append(new_entry)
+                matched_old.add(best_idx)
+            else:
+                # New detection -> add as new track with a new id
+                new_tracked.append({
+                    "id": self.next_track_id,
+                    "bbox": det["bbox"],
+                    "class": det["class"],
+                    "confidence": det["confidence"],
+                    "hits": 1,
+                    "age": 0
+                })
+                self.next_track_id += 1
+
+        # Carry over unmatched old trackers for a few frames (prevents flicker when detection misses)
+        for i, t in enumerate(tracked):
+            if i not in matched_old:
+                t_copy = dict(t)
+                t_copy["age"] = t_copy.get("age", 0) + 1
+                # decay confidence slightly so that missing tracks eventually disappear
+                t_copy["confidence"] = float(t_copy.get("confidence", 0.0)) * 0.88
+                # preserve id and hits
+                if t_copy["age"] <= self.max_age and t_copy["confidence"] > self.min_conf_keep:
+                    new_tracked.append(t_copy)
+
+        # update tracked list
+        self.tracked = new_tracked
+
+        # Prepare output detections from tracked list (apply output filters)
+        output_detections = []
+        for t in self.tracked:
+            x1, y1, x2, y2 = t["bbox"]
+            w = max(0.0, x2 - x1)
+            h = max(0.0, y2 - y1)
+            area = w * h
+            # Only include if enough hits and area threshold (tunable)
+            if int(t.get("hits", 0)) >= self.min_hits_output and area >= self.min_area_output:
+                output_detections.append({
+                    "id": int(t.get("id")) if t.get("id") is not None else None,
+                    "class": t["class"],
+                    "confidence": round(float(t.get("confidence", 0.0)), 3),
+                    "hits": int(t.get("hits", 0)),
+                    "area": round(area, 1),
+                    "bbox": [round(float(x1), 1), round(float(y1), 1), round(float(x2), 1), round(float(y2), 1)]
+                })
+        return output_detections
+
+
 # ------------------------------
 # Main detection loop
 # ------------------------------
@@ -90,7 +775,36 @@ def main():
     parser = argparse.ArgumentParser(description='YOLO Dog Detection with RTSP/Webcam support')
     parser.add_argument('--source', default='0',
                        help='Camera source: 0 for default webcam, or RTSP URL (e.g., rtsp://192.168.1.100:554/stream)')
+    parser.add_argument('--calibrate', type=int, default=0, metavar='N',
+                       help='Capture N frames from --source, build an INT8 model from them and exit (e.g., 200)')
+    parser.add_argument('--export', action='store_true',
+                       help='Export the model to TensorRT (CUDA) or ONNX (CPU) next to the .pt weights and exit')
+    parser.add_argument('--batch', type=int, default=1, metavar='N',
+                       help=f'Run YOLO on N detection frames per call (1-{MAX_BATCH}); trades latency for throughput')
+    parser.add_argument('--detect-interval', type=int, default=os.getenv('DOGSIGHT_DETECT_INTERVAL', '2'),
+                       metavar='N', help='Run YOLO on every Nth frame; frames in between reuse the last tracked '
+                                         'detections (default: $DOGSIGHT_DETECT_INTERVAL or 2)')
+    parser.add_argument('--stream', choices=['always', 'on_detection', 'never'],
+                       default=os.getenv('DOGSIGHT_STREAM', 'always'),
+                       help='When to send the JPEG frame: always (live view), only while a dog is '
+                            'detected, or never (default: $DOGSIGHT_STREAM or always)')
+    parser.add_argument('--no-adaptive-imgsz', dest='adaptive_imgsz', action='store_false',
+                       help=f'Always infer at {INFER_IMGSZ}px instead of searching at {SEARCH_IMGSZ}px '
+                            'while no dog is in view')
+    parser.add_argument('--compile', action='store_true', default=os.getenv('DOGSIGHT_COMPILE') == '1',
+                       help='torch.compile the PyTorch fallback on CUDA (slow first start; also $DOGSIGHT_COMPILE=1)')
+    parser.add_argument('--max-fps', type=float, default=0.0, metavar='FPS',
+                       help='Cap the output record rate (0 = follow the camera, the default)')
+    parser.add_argument('--legacy-ipc', action='store_true',
+                       help='Emit JSON lines with base64 frame_data instead of length-prefixed binary records')
+    parser.add_argument('--no-frames', dest='stream', action='store_const', const='never',
+                       help='Shorthand for --stream never (detections only)')
     args = parser.parse_args()
+    if args.stream not in ('always', 'on_detection', 'never'):
+        # argparse does not validate defaults, so a bad $DOGSIGHT_STREAM would slip through
+        parser.error(f"invalid DOGSIGHT_STREAM value: {args.stream!r}")
+    if args.detect_interval < 1:
+        parser.error("--detect-interval must be at least 1")
 
     # Convert source to appropriate type
     if args.source.isdigit():
@@ -103,14 +817,44 @@ def main():
 
     # Model path
     script_dir = Path(__file__).parent
-    model_path = script_dir / "yolo11s.pt"  # use nano for high FPS if you have it
     device = "cuda:0" if torch.cuda.is_available() else "cpu"
 
+    if args.export:
+        try:
+            exported_path = export_model(script_dir, device)
+            print(json.dumps({"status": "export_complete",
+                              "path": str(exported_path)}), flush=True)
+        except Exception as e:
+            print(json.dumps({"error": "export_failed",
+                              "message": str(e)}), flush=True)
+            sys.exit(1)
+        return
+
+    if args.calibrate > 0:
+        calib_dir = script_dir / "calib" / "images"
+        try:
+            print(json.dumps({"status": "calibrating",
+                              "message": f"Capturing {args.calibrate} calibration frames to {calib_dir}"}), flush=True)
+            vs = VideoStream(src=camera_source, width=640, height=480, fps=30)
+            try:
+                capture_calibration_frames(vs, calib_dir, args.calibrate)
+            finally:
+                vs.stop()
+            int8_path = export_int8_model(script_dir, device, calib_dir)
+            print(json.dumps({"status": "calibration_complete",
+                              "path": str(int8_path)}), flush=True)
+        except Exception as e:
+            print(json.dumps({"error": "calibration_failed",
+                              "message": str(e)}), flush=True)
+            sys.exit(1)
+        return
+
     # Load YOLO model
     try:
         print(json.dumps({"status": "loading_model",
                           "message": "Loading YOLO model..."}), flush=True)
-        model = YOLO(str(model_path))
+        model_path = resolve_model_path(script_dir, device)
+        model = YOLO(str(model_path), task="detect")  # exported backends load on the worker's first call
         print(json.dumps({"status": "model_loaded",
                           "path": str(model_path)}), flush=True)
     except Exception as e:
@@ -118,6 +862,42 @@ def main():
                           "message": str(e)}), flush=True)
         sys.exit(1)
 
+    # TensorRT/ONNX exports carry their own precision; the PyTorch fallbacks on CUDA run FP16 on Tensor Cores
+    half = device.startswith("cuda") and model_path.suffix in (".pt", ".torchscript")
+    resizer = FrameResizer(size=INFER_IMGSZ)
+    # NHWC lets cuDNN pick Tensor Core conv kernels for the .pt fallback
+    channels_last = device.startswith("cuda") and model_path.suffix == ".pt"
+    predict_kwargs = {**precision_kwargs(half), **layout_kwargs(channels_last)}
+    batch_size = max(1, min(args.batch, MAX_BATCH))
+    # Search at SEARCH_IMGSZ while the scene is empty, full resolution while a dog is around
+    search_imgsz = SEARCH_IMGSZ if args.adaptive_imgsz else INFER_IMGSZ
+
+    # Optional torch.compile of the .pt fallback: CUDA graphs remove the per-layer launch gaps
+    compile_model = args.compile and device.startswith("cuda") and model_path.suffix == ".pt"
+    if compile_model:
+        print(json.dumps({"status": "compiling_model",
+                          "message": "Compiling YOLO model..."}), flush=True)
+
+    # Warm up on the worker thread before the camera opens; a model that fails here never reaches the loop
+    try:
+        worker = InferenceWorker(model, resizer, device, predict_kwargs=predict_kwargs,
+                                 batch_size=batch_size, search_imgsz=search_imgsz,
+                                 channels_last=channels_last, compile=compile_model)
+        worker.wait_ready()
+    except Exception as e:
+        print(json.dumps({"error": "model_warmup_failed",
+                          "message": str(e)}), flush=True)
+        sys.exit(1)
+    if worker.search_imgsz != search_imgsz:
+        search_imgsz = worker.search_imgsz
+        print(json.dumps({"status": "adaptive_imgsz_disabled",
+                          "message": f"{model_path.name} has a fixed input size; always inferring at {INFER_IMGSZ}px"}),
+              flush=True)
+    if worker.compile_error is not None:
+        print(json.dumps({"status": "compile_skipped",
+                          "message": f"torch.compile failed, running eager PyTorch: {worker.compile_error}"}),
+              flush=True)
+
     # Initialize threaded camera
     try:
         vs = VideoStream(src=camera_source, width=640, height=480, fps=30)
@@ -129,169 +909,48 @@ def main():
                           "message": f"Failed to initialize camera: {str(e)}"}), flush=True)
         sys.exit(1)
 
-    # Tracker state and parameters
-    tracked = []  # list of dicts: {"id": int, "bbox": [x1,y1,x2,y2], "class": ..., "confidence": ..., "age": 0, "hits": n}
-    next_track_id = 1  # unique ID counter for new tracks
-
-    # Tunable parameters (adjust to reduce stray/false alerts)
-    alpha = 0.6   # EMA smoothing factor (0<alpha<=1). Higher => follow new detections faster.
-    iou_match_thresh = 0.3
-    max_age = 5   # keep tracked object for up to N frames without matches (helps prevent flicker)
-    min_conf_keep = 0.12  # if decayed confidence falls below this, drop track
-
-    # Output filtering options (frontend may also filter)
-    min_area_output = 2000.0   # if >0, will not include tiny detections in output (pixels^2)
-    min_hits_output = 3     # minimum number of hits before a track appears in output (set higher to reduce one-offs)
+    tracker = DogTracker()
+    emitter = OutputEmitter(jpeg_quality=75, legacy=args.legacy_ipc)
 
     frame_count = 0
     fps_start_time = time.time()
     fps = 0.0
     frame_send_interval = 2  # send every 2nd frame
-    detect_interval = 2       # run detection every 2nd frame (you can set to 1 to run every frame)
+    stream_mode = args.stream  # headless consumers only need detections
+    detect_interval = args.detect_interval  # run detection every Nth frame (1 = every frame)
+    output_detections = []
+    last_seen_frame = -SEARCH_AFTER_FRAMES - 1
+    # Frames waiting to be emitted, in camera order; frame is None while the worker holds it
+    pending = collections.deque()
+    finished = {}  # frame_number -> (frame, raw detections or None) back from the worker
+    # Optional pacing against a monotonic deadline; without it the blocking camera read sets the pace
+    emit_interval = 1.0 / args.max_fps if args.max_fps > 0 else 0.0
+    next_emit = time.monotonic()
 
     try:
         while True:
+            # read() blocks until the camera delivers a frame, so the camera paces the loop
             frame = vs.read()
             if frame is None:
-                # small sleep to avoid tight loop when camera temporarily unavailable
-                time.sleep(0.01)
                 continue
 
             frame_count += 1
-            raw_detections = []
 
-            # Only run YOLO on every `detect_interval` frames
+            # Only run YOLO on every `detect_interval` frames; inference runs on the worker thread
             if frame_count % detect_interval == 0:
-                # Convert BGR->RGB (Ultralytics often expects RGB)
-                try:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                except Exception:
-                    rgb = frame
-
-                # Increase conf or change iou for more stable detections
-                # using `conf` and `iou` kwargs (Ultralytics accepts these)
-                results = model(rgb, device=device, imgsz=640, conf=0.35, iou=0.45, verbose=False)
-
-                # results may be an iterable of result objects (one per image)
-                for result in results:
-                    boxes = getattr(result, "boxes", None)
-                    if boxes is None:
-                        continue
-                    # boxes can be an object containing tensors; iterate
-                    for box in boxes:
-                        try:
-                            # box.xyxy: tensor with shape (1,4) or similar; handle gracefully
-                            xyxy = box.xyxy[0].tolist() if hasattr(box, "xyxy") else None
-                            if not xyxy:
-                                continue
-                        except Exception:
-                            try:
-                                xyxy = box.xyxy.tolist()[0]
-                            except Exception:
-                                continue
-
-                        # class and confidence handling
-                        try:
-                            cls_id = int(box.cls[0]) if hasattr(box, "cls") else int(box.cls)
-                        except Exception:
-                            try:
-                                cls_id = int(box.cls.tolist()[0])
-                            except Exception:
-                                cls_id = 0
-                        try:
-                            confidence = float(box.conf[0]) if hasattr(box, "conf") else float(box.conf)
-                        except Exception:
-                            try:
-                                confidence = float(box.conf.tolist()[0])
-                            except Exception:
-                                confidence = 0.0
-
-                        # Resolve class name (model.names)
-                        class_name = model.names[cls_id] if hasattr(model, "names") and cls_id in model.names else str(cls_id)
-
-                        # filter for dogs only
-                        if class_name == "dog":
-                            x1, y1, x2, y2 = xyxy
-                            raw_detections.append({
-                                "class": class_name,
-                                "confidence": confidence,
-                                "bbox": [float(x1), float(y1), float(x2), float(y2)]
-                            })
-
-            # ---------- Simple IoU-based tracker with EMA smoothing ----------
-            new_tracked = []
-            matched_old = set()
-
-            # Match raw detections to tracked objects
-            for det in raw_detections:
-                best_iou = 0.0
-                best_idx = -1
-                for i, t in enumerate(tracked):
-                    if t.get("class") != det.get("class"):
-                        continue
-                    try:
-                        iou_val = iou(t["bbox"], det["bbox"])
-                    except Exception:
-                        iou_val = 0.0
-                    if iou_val > best_iou:
-                        best_iou = iou_val
-                        best_idx = i
-                if best_idx != -1 and best_iou >= iou_match_thresh:
-                    old = tracked[best_idx]
-                    smoothed_bbox = ema_smooth(old["bbox"], det["bbox"], alpha)
-                    new_entry = {
-                        "id": old.get("id", None),
-                        "bbox": smoothed_bbox,
-                        "class": det["class"],
-                        "confidence": max(det["confidence"], old.get("confidence", 0.0)),
-                        "hits": int(old.get("hits", 0) + 1),
-                        "age": 0
-                    }
-                    new_tracked.append(new_entry)
-                    matched_old.add(best_idx)
-                else:
-                    # New detection -> add as new track with a new id
-                    new_tracked.append({
-                        "id": next_track_id,
-                        "bbox": det["bbox"],
-                        "class": det["class"],
-                        "confidence": det["confidence"],
-                        "hits": 1,
-                        "age": 0
-                    })
-                    next_track_id += 1
-
-            # Carry over unmatched old trackers for a few frames (prevents flicker when detection misses)
-            for i, t in enumerate(tracked):
-                if i not in matched_old:
-                    t_copy = dict(t)
-                    t_copy["age"] = t_copy.get("age", 0) + 1
-                    # decay confidence slightly so that missing tracks eventually disappear
-                    t_copy["confidence"] = float(t_copy.get("confidence", 0.0)) * 0.88
-                    # preserve id and hits
-                    if t_copy["age"] <= max_age and t_copy["confidence"] > min_conf_keep:
-                        new_tracked.append(t_copy)
-
-            # update tracked list
-            tracked = new_tracked
-
-            # Prepare output detections from tracked list (apply output filters)
-            output_detections = []
-            for t in tracked:
-                x1, y1, x2, y2 = t["bbox"]
-                w = max(0.0, x2 - x1)
-                h = max(0.0, y2 - y1)
-                area = w * h
-                # Only include if enough hits and area threshold (tunable)
-                if int(t.get("hits", 0)) >= min_hits_output and area >= min_area_output:
-                    output_detections.append({
-                        "id": int(t.get("id")) if t.get("id") is not None else None,
-                        "class": t["class"],
-                        "confidence": round(float(t.get("confidence", 0.0)), 3),
-                        "hits": int(t.get("hits", 0)),
-                        "area": round(area, 1),
-                        "bbox": [round(float(x1), 1), round(float(y1), 1), round(float(x2), 1), round(float(y2), 1)]
-                    })
+                idle = frame_count - last_seen_frame > SEARCH_AFTER_FRAMES
+                evicted = worker.submit(frame_count, frame, search_imgsz if idle else INFER_IMGSZ)
+                pending.append((frame_count, None))
+                if evicted is not None:
+                    # Dropped before the worker got to it: emit it like a skipped frame
+                    finished[evicted[0]] = (evicted[1], None)
+            else:
+                pending.append((frame_count, frame))
+
+            for frame_number, inferred_frame, raw_detections in worker.poll():
+                if raw_detections:
+                    last_seen_frame = frame_number
+                finished[frame_number] = (inferred_frame, raw_detections)
 
             # Calculate FPS every 30 frames (moving window)
             if frame_count % 30 == 0:
@@ -300,40 +959,59 @@ def main():
                 fps = 30 / elapsed if elapsed > 0 else 0.0
                 fps_start_time = fps_end_time
 
-            # Encode frame as base64 every `frame_send_interval` frames
-            frame_data = None
-            if frame_count % frame_send_interval == 0:
-                try:
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-                    frame_data = base64.b64encode(buffer).decode('utf-8')
-                except Exception:
-                    frame_data = None
-
-            # Output JSON
-            output = {
-                "frame": frame_count,
-                "timestamp": time.time(),
-                "detections": output_detections,
-                "fps": round(fps, 1),
-                "frame_width": frame.shape[1],
-                "frame_height": frame.shape[0]
-            }
-            if frame_data:
-                output["frame_data"] = frame_data
-
-            print(json.dumps(output), flush=True)
+            # Emit in camera order. A frame handed to the worker waits for its own detections and
+            # holds back the frames behind it, so every record carries boxes computed on its own
+            # frame or, for skipped frames, on the last inferred frame before it. The cost is that
+            # records trail the camera by the inference latency.
+            while pending:
+                frame_number, out_frame = pending[0]
+                if out_frame is None:
+                    if frame_number not in finished:
+                        break
+                    out_frame, raw_detections = finished.pop(frame_number)
+                    if raw_detections is not None:
+                        # Step the tracker once per finished inference; frames in between reuse its last output
+                        output_detections = tracker.update(raw_detections)
+                pending.popleft()
+
+                # Output JSON
+                output = {
+                    "frame": frame_number,
+                    "timestamp": time.time(),
+                    "detections": output_detections,
+                    "fps": round(fps, 1),
+                    "frame_width": out_frame.shape[1],
+                    "frame_height": out_frame.shape[0]
+                }
+
+                # Attach the JPEG frame every `frame_send_interval` frames (encoded off-thread)
+                # JPEG encode is the dominant per-record cost, so skip it whenever the consumer doesn't need it
+                send_frame = (stream_mode == "always" or (stream_mode == "on_detection" and output_detections)) \
+                    and frame_number % frame_send_interval == 0
+
+                if emit_interval:
+                    now = time.monotonic()
+                    if now < next_emit:
+                        time.sleep(next_emit - now)
+                    next_emit = max(next_emit, now) + emit_interval
+                emitter.submit(output, out_frame if send_frame else None)
 
     except KeyboardInterrupt:
-        print(json.dumps({"status": "stopped"}), flush=True)
+        emitter.submit({"status": "stopped"})
+    except BrokenPipeError:
+        pass  # the consumer closed stdout; there is nobody left to report to
     except Exception as e:
-        print(json.dumps({"error": "runtime_error",
-                          "message": str(e)}), flush=True)
+        emitter.submit({"error": "runtime_error",
+                        "message": str(e)})
     finally:
         try:
             vs.stop()
         except:
             pass
-        print(json.dumps({"status": "cleanup_complete"}), flush=True)
+        worker.stop()
+        emitter.close()
+        if not emitter.failed.is_set():
+            print(json.dumps({"status": "cleanup_complete"}), flush=True)
 
 
 if __name__ == "__main__":
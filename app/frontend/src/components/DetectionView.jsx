@@ -6,6 +6,8 @@ import { isDetectionInSafeZone } from "../utils/geometry";
 const TIMEOUT_WINDOWS = {
   startup: 60000,        // 60s - Python startup + library imports (cv2, ultralytics)
   loading_model: 60000,  // 60s - YOLO model loading
+  exporting_model: 900000, // 15min - one-time TensorRT/ONNX export on first run
+  compiling_model: 600000, // 10min - opt-in torch.compile of the PyTorch fallback
   camera_opened: 5000,   // 5s - Camera initialization
   testing_camera: 5000,  // 5s - Camera test
   first_frame: 5000,     // 5s - First frame arrival
@@ -15,6 +17,8 @@ const TIMEOUT_WINDOWS = {
 const TIMEOUT_MAC = {
   startup: 60000,        // 60s - Mac/ARM can be slower
   loading_model: 60000,  // 60s - YOLO model loading on ARM
+  exporting_model: 900000, // 15min - one-time ONNX export on first run
+  compiling_model: 600000, // 10min - opt-in torch.compile of the PyTorch fallback
   camera_opened: 8000,   // 8s - Camera initialization
   testing_camera: 7000,  // 7s - Camera test
   first_frame: 5000,     // 5s - First frame arrival
@@ -25,6 +29,8 @@ const TIMEOUT_MAC = {
 const PHASE_MESSAGES = {
   startup: "Starting detection...",
   loading_model: "Loading AI model...",
+  exporting_model: "Optimizing AI model (first run only)...",
+  compiling_model: "Compiling AI model...",
   model_loaded: "AI model loaded",
   camera_opened: "Opening camera...",
   testing_camera: "Testing camera...",
@@ -209,6 +215,8 @@ export default function DetectionView({
           const phaseInfo = {
             startup: "The Python detection script is starting up and loading libraries. This may take longer on first run.",
             loading_model: "The AI model is being loaded into memory. Large models may take time to initialize.",
+            exporting_model: "The AI model is being converted to an optimized format. This only happens on first run.",
+            compiling_model: "The AI model is being compiled for this GPU. This happens on every start while DOGSIGHT_COMPILE is enabled.",
             camera_opened: "Attempting to open and initialize the camera device.",
             testing_camera: "Testing camera connectivity and frame capture.",
             first_frame: "Waiting for the first camera frame to arrive."
@@ -279,6 +287,8 @@ export default function DetectionView({
         const statusToPhase = {
           "startup": "startup",
           "loading_model": "loading_model",
+          "exporting_model": "exporting_model",
+          "compiling_model": "compiling_model",
           "model_loaded": "model_loaded",
           "camera_opened": "camera_opened",
           "testing_camera": "testing_camera",
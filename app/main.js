@@ -546,29 +546,60 @@ function startDetection() {
 
     console.log("🐶 Detection process started");
 
-    // Handle stdout (detection results)
+    const handleDetectionOutput = (text, frame) => {
+      if (!text.trim()) return;
+      try {
+        const result = JSON.parse(text);
+
+        // Binary IPC sends the JPEG as its own record; the renderer still expects base64
+        if (frame) {
+          result.frame_data = frame.toString("base64");
+        }
+
+        // Track if Python sent an error
+        if (result.error) {
+          pythonErrorReceived = true;
+        }
+
+        // Process for alert monitoring
+        processDetectionForAlert(result);
+
+        // Send detection result to renderer
+        safelySendToRenderer("detection-result", result);
+      } catch (err) {
+        console.error("⚠️ Failed to parse detection output:", text);
+      }
+    };
+
+    // Handle stdout (detection results): binary records are NUL, tag ("F" = JPEG, "M" = JSON),
+    // uint32 LE length, payload; anything else is a text line (startup statuses, logs, --legacy-ipc)
+    let stdoutBuffer = Buffer.alloc(0);
+    let pendingFrame = null;
     detectionProcess.stdout.on("data", (data) => {
-      const lines = data.toString().split("\n");
-      lines.forEach((line) => {
-        if (line.trim()) {
-          try {
-            const result = JSON.parse(line);
-
-            // Track if Python sent an error
-            if (result.error) {
-              pythonErrorReceived = true;
-            }
-
-            // Process for alert monitoring
-            processDetectionForAlert(result);
-
-            // Send detection result to renderer
-            safelySendToRenderer("detection-result", result);
-          } catch (err) {
-            console.error("⚠️ Failed to parse detection output:", line);
+      stdoutBuffer = stdoutBuffer.length ? Buffer.concat([stdoutBuffer, data]) : data;
+      let offset = 0;
+      while (offset < stdoutBuffer.length) {
+        if (stdoutBuffer[offset] === 0) {
+          if (stdoutBuffer.length - offset < 6) break;
+          const tag = String.fromCharCode(stdoutBuffer[offset + 1]);
+          const end = offset + 6 + stdoutBuffer.readUInt32LE(offset + 2);
+          if (stdoutBuffer.length < end) break;
+          const payload = stdoutBuffer.subarray(offset + 6, end);
+          offset = end;
+          if (tag === "F") {
+            pendingFrame = payload;
+          } else if (tag === "M") {
+            handleDetectionOutput(payload.toString("utf8"), pendingFrame);
+            pendingFrame = null;
           }
+        } else {
+          const newline = stdoutBuffer.indexOf(0x0a, offset);
+          if (newline === -1) break;
+          handleDetectionOutput(stdoutBuffer.toString("utf8", offset, newline), null);
+          offset = newline + 1;
         }
-      });
+      }
+      stdoutBuffer = stdoutBuffer.subarray(offset);
     });
 
     // Handle stderr (errors and logs)